@@ -23,9 +23,12 @@
 from lxml import etree # Ubuntu Karmic package: python-lxml
 import sys, re, os, glob
 import base64
+import copy
+from collections import OrderedDict
 from optparse import OptionParser
-from io import IOBase
-from six import string_types
+from io import TextIOBase
+from six import string_types, text_type
+from six.moves import intern
 
 import logging
 
@@ -46,7 +49,36 @@ CM2PT = 72.0/2.54
 PT2PX = 1.25
 PX2PT = 1.0/1.25
 
-relIRI_re = re.compile(r'url\(#(.*)\)')
+# Clark notation namespaces and tags
+SVG_NS = '{http://www.w3.org/2000/svg}'
+XLINK_NS = '{http://www.w3.org/1999/xlink}'
+SODIPODI_NS = '{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}'
+
+SVG_SVG = intern(SVG_NS + 'svg')
+SVG_DEFS = intern(SVG_NS + 'defs')
+SVG_METADATA = intern(SVG_NS + 'metadata')
+SVG_G = intern(SVG_NS + 'g')
+SVG_RECT = intern(SVG_NS + 'rect')
+SVG_IMAGE = intern(SVG_NS + 'image')
+SODIPODI_NAMEDVIEW = intern(SODIPODI_NS + 'namedview')
+XLINK_HREF = intern(XLINK_NS + 'href')
+
+# children of input <svg> elements not copied to the output
+_SKIP_TAGS = frozenset((SODIPODI_NAMEDVIEW, SVG_METADATA))
+
+relIRI_re = re.compile(r'url\(#([^)]+)\)')
+
+# The parser is shared by all input files. huge_tree lifts libxml2's 10 MB
+# limit on text nodes, which large embedded (base64) images easily exceed.
+_PARSER = etree.XMLParser(huge_tree=True, no_network=True)
+
+# Pristine trees of files that were parsed more than once, see
+# parse_svg(). The cache is bounded by the total size of the files.
+_PARSE_CACHE_BYTES = 32*1024*1024
+_parse_cache = OrderedDict()
+# files parsed once so far (no tree kept)
+_PARSE_SEEN_SIZE = 1024
+_parse_seen = OrderedDict()
 
 def get_unit_attr(value):
     """ coordinate handling from http://www.w3.org/TR/SVG11/coords.html#Units
@@ -61,6 +93,15 @@ def get_unit_attr(value):
     val_float = float(value) # this will fail if units str not parsed
     return val_float, units
 
+def get_viewbox(value):
+    """ parse a viewBox attribute into (min-x, min-y, width, height)
+
+    The numbers may be separated by commas and/or whitespace.
+    """
+    vb_tup = value.replace(',', ' ').split()
+    assert len(vb_tup)==4
+    return tuple(map(float, vb_tup))
+
 def convert_to_pixels(val, units):
     if units == 'px' or units is None:
         val_px = val
@@ -77,84 +118,111 @@ def convert_to_pixels(val, units):
     log.debug("{} {} = {} px".format(val, units, val_px))
     return val_px
 
-def fix_ids( elem, prefix, level=0 ):
-    ns = '{http://www.w3.org/2000/svg}'
+def fix_ids( elem, prefix ):
+    """prefix all ids in the subtree rooted at elem, and references to them"""
+    hash_prefix = '#' + prefix
+    url_prefix = 'url(#' + prefix
 
-    if isinstance(elem.tag, string_types) and elem.tag.startswith(ns):
+    def fix_iri(match):
+        return url_prefix + match.group(1) + ')'
 
-        tag = elem.tag[len(ns):]
-
-        if 'id' in elem.attrib:
-            elem.attrib['id'] = prefix + elem.attrib['id']
+    # iterate over svg elements only (lxml filters the tags in C)
+    for node in elem.iter(SVG_NS + '*'):
+        if 'id' in node.attrib:
+            node.attrib['id'] = prefix + node.attrib['id']
 
         # fix references (See http://www.w3.org/TR/SVGTiny12/linking.html#IRIReference )
 
-        for attrib in elem.attrib.keys():
-            value = elem.attrib.get(attrib,None)
-
-            if value is not None:
-
-                if attrib.startswith('{http://www.w3.org/1999/xlink}'):
-                    relIRI = False
-                else:
-                    relIRI = True
-
-                if (not relIRI) and value.startswith('#'): # local IRI, change
-                    iri = value[1:]
-                    value = '#' + prefix + iri
-                    elem.attrib[attrib] = value
-                elif relIRI:
-                    newvalue = re.sub( relIRI_re, r'url(#'+prefix+r'\1)', value)
-                    if newvalue != value:
-                        elem.attrib[attrib] = newvalue
-
-        # Do same for children
-
-    for child in elem:
-        fix_ids(child,prefix,level=level+1)
+        # items() is a snapshot, so the values may be changed in the loop
+        for attrib, value in node.attrib.items():
+            if not value:
+                continue
+            if attrib.startswith(XLINK_NS):
+                if value[:1] == '#': # local IRI, change
+                    node.attrib[attrib] = hash_prefix + value[1:]
+            elif 'url(' in value:
+                newvalue = relIRI_re.sub( fix_iri, value )
+                if newvalue != value:
+                    node.attrib[attrib] = newvalue
 
 def export_images( elem, filename_fmt='image%03d', start_idx=1 ):
     """replace inline images with files"""
-    ns = '{http://www.w3.org/2000/svg}'
-    href = '{http://www.w3.org/1999/xlink}href'
     count = 0
-    if isinstance(elem.tag, string_types) and elem.tag.startswith(ns):
-        tag = elem.tag[len(ns):]
-        if tag=='image':
-            buf = etree.tostring(elem, pretty_print=True)
-            im_data = elem.attrib[href]
-            exts = ['png','jpeg']
-            found = False
-            for ext in exts:
-                prefix = 'data:image/'+ext+';base64,'
-                if im_data.startswith(prefix):
-                    data_base64 = im_data[len(prefix):]
-                    found = True
-                    break
-            if not found:
-                raise NotImplementedError('image found but not supported')
-
-            # decode data
-            data = base64.b64decode(data_base64)
-
-            # save data
-            idx = start_idx + count
-            fname = filename_fmt%idx + '.' + ext
-            if os.path.exists(fname):
-                raise RuntimeError('File exists: %r'%fname)
-            with open(fname,mode='w') as fd:
-                fd.write( data )
-
-            # replace element with link
-            elem.attrib[href] = fname
-            count += 1
-
-    # Do same for children
-    for child in elem:
-        count += export_images(child, filename_fmt=filename_fmt,
-                               start_idx=(start_idx+count) )
+    for image in elem.iter(SVG_IMAGE):
+        im_data = image.attrib[XLINK_HREF]
+        exts = ['png','jpeg']
+        found = False
+        for ext in exts:
+            prefix = 'data:image/'+ext+';base64,'
+            if im_data.startswith(prefix):
+                data_base64 = im_data[len(prefix):]
+                found = True
+                break
+        if not found:
+            raise NotImplementedError('image found but not supported')
+
+        # save data
+        idx = start_idx + count
+        fname = filename_fmt%idx + '.' + ext
+        if os.path.exists(fname):
+            raise RuntimeError('File exists: %r'%fname)
+        with open(fname,mode='wb') as fd:
+            fd.write( base64.b64decode(data_base64) )
+
+        # replace element with link
+        image.attrib[XLINK_HREF] = fname
+        count += 1
     return count
 
+def parse_svg(fname):
+    """parse fname and return its root element
+
+    The same file is often stacked several times (e.g. repeated icons).
+    Once a file is parsed a second time, a pristine copy of its tree is
+    kept, keyed by file name, modification time and size, and later
+    callers get their own deep copy of it (fix_ids() modifies the tree).
+    Files seen only once are not kept, so stacking distinct files costs
+    no extra memory or copying.
+    """
+    if not isinstance(fname, string_types):
+        # file-like object
+        return etree.parse(fname, _PARSER).getroot()
+    st = os.stat(fname)
+    key = (os.path.abspath(fname), st.st_mtime, st.st_size)
+    root = _parse_cache.pop(key, None)
+    if root is not None:
+        _parse_cache[key] = root # now most recently used
+        return copy.deepcopy(root)
+
+    root = etree.parse(fname, _PARSER).getroot()
+    if _parse_seen.pop(key, False) is False:
+        # first time: only remember the file
+        _parse_seen[key] = None
+        if len(_parse_seen) > _PARSE_SEEN_SIZE:
+            _parse_seen.popitem(last=False)
+    elif st.st_size <= _PARSE_CACHE_BYTES:
+        # repeated file, keep a pristine copy
+        _parse_cache[key] = copy.deepcopy(root)
+        while sum(k[2] for k in _parse_cache) > _PARSE_CACHE_BYTES:
+            _parse_cache.popitem(last=False) # least recently used
+    return root
+
+def clear_parse_cache():
+    """forget all files remembered by parse_svg()"""
+    _parse_cache.clear()
+    _parse_seen.clear()
+
+def _add_debug_box(accum, coord, size, color, stroke_width):
+    """outline a rectangle of the layout (see Document.save(debug_boxes=True))"""
+    debug_box = etree.Element(SVG_RECT)
+    debug_box.attrib['style']=(
+        'fill: none; stroke: %s; stroke-width: %f;'%(color, stroke_width))
+    debug_box.attrib['x']=repr(coord[0])
+    debug_box.attrib['y']=repr(coord[1])
+    debug_box.attrib['width']=repr(size.width)
+    debug_box.attrib['height']=repr(size.height)
+    accum.add_raw_element(debug_box)
+
 header_str = '<?xml version="1.0" encoding="UTF-8"?>'
 
 # ------------------------------------------------------------------
@@ -170,30 +238,47 @@ class Document(object):
             raise ValueError('No layout, cannot save.')
         accum = LayoutAccumulator(**kwargs)
         self._layout.render(accum, debug_boxes=debug_boxes)
-        try:
-            isfile = isinstance(fileobj, file)
-        except NameError:
-            isfile = isinstance(fileobj, IOBase)
+        # Anything with write() is used as a file. io text streams get
+        # str, all other writers get UTF-8 encoded bytes.
+        isfile = hasattr(fileobj, 'write')
         if isfile:
             fd = fileobj
             close = False
         else:
-            fd = open(fileobj, mode='w')
+            fd = open(fileobj, mode='wb')
             close = True
-        buf = accum.tostring(pretty_print=True)
+        root = accum._make_finalized_root()
 
-        fd.write(header_str)
-        fd.write('\n')
-        fd.write( buf.decode() )
+        if isinstance(fd, TextIOBase) and not hasattr(fd, 'buffer'):
+            # in-memory text stream (e.g. io.StringIO), which only
+            # accepts unicode on Python 2
+            fd.write(text_type(header_str) + u'\n')
+            fd.write( etree.tostring(root, pretty_print=True, encoding='unicode') )
+        else:
+            if isinstance(fd, TextIOBase):
+                # write the encoded bytes underneath e.g. sys.stdout
+                fd.flush()
+                out = fd.buffer
+            else:
+                out = fd
+            # serialize directly into the output, without an intermediate copy
+            out.write(header_str.encode())
+            out.write(b'\n')
+            with etree.xmlfile(out, encoding='utf-8') as xf:
+                xf.write(root, pretty_print=True)
+            if hasattr(out, 'flush'):
+                out.flush()
         if close:
             fd.close()
 
 
 class SVGFileBase(object):
+    _do_layout = True
+
     def __init__(self, fname):
         self._fname = fname
-        self._root = etree.parse(fname).getroot()
-        if self._root.tag != '{http://www.w3.org/2000/svg}svg':
+        self._root = parse_svg(fname)
+        if self._root.tag != SVG_SVG:
             raise ValueError('expected file to have root element <svg:svg>')
 
         if 'height' in self._root.keys():
@@ -201,10 +286,7 @@ class SVGFileBase(object):
             width, width_units = get_unit_attr(self._root.get('width'))
         else:
             # R svglite does not set the height and width attributes. Get them from the viewBox attribute.
-            vbox = self._root.get('viewBox')
-            _, _, width, height = vbox.split(' ')
-            width =  float(width)
-            height = float(height)
+            _, _, width, height = get_viewbox(self._root.get('viewBox'))
             width_units = height_units = 'px' # The default
         self._width_px = convert_to_pixels( width, width_units)
         self._height_px = convert_to_pixels( height, height_units)
@@ -220,6 +302,10 @@ class SVGFileBase(object):
     def get_size(self,min_size=None,box_align=None,level=None):
         return Size(self._width_px, self._height_px)
 
+    def _measured_size(self, min_size, box_align, level):
+        # size as seen by the enclosing BoxLayout
+        return self.get_size(min_size=min_size, box_align=box_align, level=level)
+
     def _set_size(self, size):
         if self._width_px != size.width:
             log.warning("Changing width of {} from {:.2f} to {:.2f}".format(
@@ -236,13 +322,25 @@ class SVGFileBase(object):
     def export_images(self, *args, **kwargs):
         export_images(self._root, *args, **kwargs)
 
+    def _clear_size_cache(self):
+        # files have a fixed size, nothing cached
+        pass
+
 
 class SVGFile(SVGFileBase):
     def __str__(self):
         return 'SVGFile(%s)'%repr(self._fname)
 
+    def _accumulate(self, accum, level, debug_boxes):
+        accum.add_svg_file(self)
+        if debug_boxes>0:
+            # draw red line around SVG file
+            _add_debug_box(accum, self._coord, self.get_size(), 'red', 1)
+
 
 class SVGFileNoLayout(SVGFileBase):
+    _do_layout = False
+
     def __init__(self,fname,x=0,y=0):
         self._x_offset = x
         self._y_offset = y
@@ -255,6 +353,16 @@ class SVGFileNoLayout(SVGFileBase):
     def __str__(self):
         return 'SVGFileNoLayout(%s)'%repr(self._fname)
 
+    def _measured_size(self, min_size, box_align, level):
+        # takes no space in the enclosing BoxLayout
+        return Size(0, 0)
+
+    def _accumulate(self, accum, level, debug_boxes):
+        accum.add_svg_file_no_layout(self)
+        if debug_boxes>0:
+            # draw green line around SVG file
+            _add_debug_box(accum, self._coord, self.get_size(), 'green', 1)
+
 
 class LayoutAccumulator(object):
     def __init__(self):
@@ -303,12 +411,12 @@ class LayoutAccumulator(object):
                 log.debug("adding {} to NSMAP at {}".format(value, key))
                 NSMAP[key] = value
 
-        root = etree.Element('{http://www.w3.org/2000/svg}svg',
+        root = etree.Element(SVG_SVG,
                              nsmap=NSMAP)
 
         if 1:
             # inkscape hack
-            root_defs = etree.SubElement(root,'{http://www.w3.org/2000/svg}defs')
+            root_defs = etree.SubElement(root,SVG_DEFS)
 
         root.attrib['version']='1.1'
         fname_num = 0
@@ -325,7 +433,7 @@ class LayoutAccumulator(object):
             origelem = svgfile.get_root()
 
             fix_id_prefix = 'id%d:' % fname_num
-            elem = etree.SubElement(root,'{http://www.w3.org/2000/svg}g')
+            elem = etree.SubElement(root,SVG_G)
 
             elem.attrib['id'] = 'id{}'.format(fname_num)
 
@@ -335,21 +443,19 @@ class LayoutAccumulator(object):
 
             # copy svg contents into new group
             for child in origelem:
-                if 1:
-                    # inkscape hacks
-                    if child.tag == '{http://www.w3.org/2000/svg}defs':
-                        # copy into root_defs, not into sub-group
-                        log.debug("Copying element from {}".format(svgfile))
-                        for subchild in child:
-                            fix_ids( subchild, fix_id_prefix )
-                            root_defs.append( subchild )
-                        continue
-                    elif child.tag == '{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}:namedview':
-                        # don't copy
-                        continue
-                    elif child.tag == '{http://www.w3.org/2000/svg}metadata':
-                        # don't copy
-                        continue
+                # inkscape hacks
+                tag = child.tag
+                if tag == SVG_DEFS:
+                    # copy into root_defs, not into sub-group
+                    log.debug("Copying element from %s", svgfile)
+                    fix_ids( child, fix_id_prefix )
+                    # move the children over in one go, copying the
+                    # list so that they are not moved while iterating
+                    root_defs.extend( list(child) )
+                    continue
+                if tag in _SKIP_TAGS:
+                    # don't copy
+                    continue
                 elem.append(child)
 
             fix_ids( elem, fix_id_prefix )
@@ -373,24 +479,16 @@ class LayoutAccumulator(object):
                         svgfile,))
             orig_viewBox = origelem.get('viewBox')
             if orig_viewBox is not None:
-                # split by comma or whitespace
-                vb_tup = orig_viewBox.split(',')
-                vb_tup = [c.strip() for c in vb_tup]
-                if len(vb_tup)==1:
-                    # not separated by commas
-                    vb_tup = orig_viewBox.split()
-                assert len(vb_tup)==4
-                vb_tup = [float(v) for v in vb_tup]
-                vbminx, vbminy, vbwidth, vbheight = vb_tup
+                vbminx, vbminy, vbwidth, vbheight = get_viewbox(orig_viewBox)
                 sx = width_px / vbwidth
                 sy = height_px / vbheight
                 tx = translate_x - vbminx
                 ty = translate_y - vbminy
                 elem.attrib['transform'] = 'matrix(%s,0,0,%s,%s,%s)'%(sx, sy, tx, ty)
-                log.debug("matrix xform ({}, 0, 0, {}, {}, {})".format(sx, sy, tx, ty))
+                log.debug("matrix xform (%s, 0, 0, %s, %s, %s)", sx, sy, tx, ty)
             else:
                 elem.attrib['transform'] = 'translate(%s,%s)'%(translate_x, translate_y)
-                log.debug("Translating ({}, {})".format(translate_x, translate_y))
+                log.debug("Translating (%s, %s)", translate_x, translate_y)
             root.append( elem )
         for elem in self._raw_elements:
             root.append(elem)
@@ -413,6 +511,27 @@ RightToLeft = 'RightToLeft'
 TopToBottom = 'TopToBottom'
 BottomToTop = 'BottomToTop'
 
+_HORIZ = frozenset((LeftToRight, RightToLeft))
+
+# accessors used by BoxLayout to work along and across its direction
+def _size_width(size):
+    return size.width
+
+def _size_height(size):
+    return size.height
+
+def _size_wh(along, across):
+    return Size(along, across)
+
+def _size_hw(along, across):
+    return Size(across, along)
+
+def _coord_xy(along, across):
+    return (along, across)
+
+def _coord_yx(along, across):
+    return (across, along)
+
 # alignment values
 AlignLeft = 0x01
 AlignRight = 0x02
@@ -425,123 +544,128 @@ AlignVCenter = 0x080
 AlignCenter = AlignHCenter | AlignVCenter
 
 class Layout(object):
+    _do_layout = True
+
     def __init__(self, parent=None):
         if parent is not None:
             raise NotImplementedError('')
 
+    def _accumulate(self, accum, level, debug_boxes):
+        raise NotImplementedError(
+            "don't know how to accumulate item %s"%self)
+
+    def _clear_size_cache(self):
+        pass
+
 
 class BoxLayout(Layout):
     def __init__(self, direction, parent=None):
         super(BoxLayout, self).__init__(parent=parent)
         self._direction = direction
+        # Specialize for the direction once instead of testing it for
+        # every item. "along" is the layout direction, "across" the other.
+        if direction in _HORIZ:
+            self._along, self._across = _size_width, _size_height
+            self._make_size = _size_wh
+        else:
+            self._along, self._across = _size_height, _size_width
+            self._make_size = _size_hw
+        if direction == LeftToRight:
+            self._make_coord = _coord_xy
+        elif direction == TopToBottom:
+            self._make_coord = _coord_yx
+        else:
+            self._make_coord = None # not implemented
         self._items = []
         self._contents_margins = 0 # around edge of box
         self._spacing = 0 # between items in box
         self._coord = (0, 0) # default
         self._size = None # uncalculated
+        self._size_cache = {}
 
     def _set_coord(self,coord):
         self._coord = coord
 
+    def _clear_size_cache(self):
+        self._size_cache.clear()
+        for (item, stretch, alignment, xml) in self._items:
+            item._clear_size_cache()
+
     def render(self, accum, min_size=None, level=0, debug_boxes=0):
+        if level==0:
+            # the layout may have been modified since the last render
+            self._clear_size_cache()
         size = self.get_size(min_size=min_size)
         if level==0:
             # set document size if top level
             accum._set_size(size)
         if debug_boxes>0:
             # draw black line around BoxLayout element
-            debug_box = etree.Element('{http://www.w3.org/2000/svg}rect')
-            debug_box.attrib['style']=(
-                'fill: none; stroke: black; stroke-width: 2.000000;')
-            sz=size
-            debug_box.attrib['x']=repr(self._coord[0])
-            debug_box.attrib['y']=repr(self._coord[1])
-            debug_box.attrib['width']=repr(sz.width)
-            debug_box.attrib['height']=repr(sz.height)
-            accum.add_raw_element(debug_box)
+            _add_debug_box(accum, self._coord, size, 'black', 2)
 
         for (item, stretch, alignment, xml) in self._items:
-            if isinstance( item, SVGFile ):
-                accum.add_svg_file(item)
-
-                if debug_boxes>0:
-                    # draw red line around SVG file
-                    debug_box= etree.Element('{http://www.w3.org/2000/svg}rect')
-                    debug_box.attrib['style']=(
-                        'fill: none; stroke: red; stroke-width: 1.000000;')
-                    sz=item.get_size()
-                    debug_box.attrib['x']=repr(item._coord[0])
-                    debug_box.attrib['y']=repr(item._coord[1])
-                    debug_box.attrib['width']=repr(sz.width)
-                    debug_box.attrib['height']=repr(sz.height)
-                    accum.add_raw_element(debug_box)
-            elif isinstance( item, SVGFileNoLayout ):
-                accum.add_svg_file_no_layout(item)
-
-                if debug_boxes>0:
-                    # draw green line around SVG file
-                    debug_box= etree.Element('{http://www.w3.org/2000/svg}rect')
-                    debug_box.attrib['style']=(
-                        'fill: none; stroke: green; stroke-width: 1.000000;')
-                    sz=item.get_size()
-                    debug_box.attrib['x']=repr(item._coord[0])
-                    debug_box.attrib['y']=repr(item._coord[1])
-                    debug_box.attrib['width']=repr(sz.width)
-                    debug_box.attrib['height']=repr(sz.height)
-                    accum.add_raw_element(debug_box)
-
-            elif isinstance( item, BoxLayout ):
-                item.render( accum, min_size=item._size, level=level+1,
-                             debug_boxes=debug_boxes)
-            else:
-                raise NotImplementedError(
-                    "don't know how to accumulate item %s"%item)
+            item._accumulate(accum, level, debug_boxes)
 
             if xml is not None:
-                extra = etree.Element('{http://www.w3.org/2000/svg}g')
-                extra.attrib['transform'] = 'translate(%s,%s)'%(
-                    repr(item._coord[0]),repr(item._coord[1]))
+                extra = etree.Element(SVG_G)
+                extra.attrib['transform'] = 'translate(%r,%r)'%(
+                    item._coord[0], item._coord[1])
                 extra.append(xml)
                 accum.add_raw_element(extra)
 
-    def get_size(self, min_size=None, box_align=0, level=0):
-        cum_dim = 0 # size along layout direction
-        max_orth_dim = 0 # size along other direction
+    def _accumulate(self, accum, level, debug_boxes):
+        self.render( accum, min_size=self._size, level=level+1,
+                     debug_boxes=debug_boxes)
+
+    def _measured_size(self, min_size, box_align, level):
+        return self.get_size(min_size=min_size, box_align=box_align, level=level)
 
+    def get_size(self, min_size=None, box_align=0, level=0):
         if min_size is None:
             min_size = Size(0, 0)
 
+        # Nested layouts get asked for their size several times with the
+        # same arguments, so remember the result. Items are placed
+        # relative to self._coord, which changes between calls, so the
+        # placement of each item is cached relative to it and re-applied.
+        key = (min_size.width, min_size.height, box_align)
+        cached = self._size_cache.get(key)
+        if cached is not None:
+            size, placements = cached
+            self._place_items(placements)
+            self._size = size
+            return size
+
+        along = self._along
+        across = self._across
+        make_size = self._make_size
+        make_coord = self._make_coord
+
+        cum_dim = 0 # size along layout direction
+
         # Step 1: calculate required size along self._direction
-        if self._direction in [LeftToRight, RightToLeft]:
-            max_orth_dim = min_size.height
-            dim_min_size = Size(width=0,
-                                height=max_orth_dim)
-        else:
-            max_orth_dim = min_size.width
-            dim_min_size = Size(width=max_orth_dim,
-                                height=0)
+        max_orth_dim = across(min_size) # size along other direction
+        dim_min_size = make_size(0, max_orth_dim)
+
+        items = self._items
+        n_items = len(items)
 
         cum_dim += self._contents_margins # first margin
         item_sizes = []
-        for item_number,(item,stretch,alignment,xml) in enumerate(self._items):
-            if isinstance(item, SVGFileNoLayout):
-                item_size = Size(0, 0)
-            else:
-                item_size = item.get_size(min_size=dim_min_size, box_align=alignment,level=level+1)
+        total_stretch = 0
+        for item_number,(item,stretch,alignment,xml) in enumerate(items):
+            item_size = item._measured_size(dim_min_size, alignment, level+1)
             item_sizes.append( item_size )
+            total_stretch += stretch
 
-            if isinstance(item, SVGFileNoLayout):
+            if not item._do_layout:
                 # no layout for this file
                 continue
 
-            if self._direction in [LeftToRight, RightToLeft]:
-                cum_dim += item_size.width
-                max_orth_dim = max(max_orth_dim,item_size.height)
-            else:
-                cum_dim += item_size.height
-                max_orth_dim = max(max_orth_dim,item_size.width)
+            cum_dim += along(item_size)
+            max_orth_dim = max(max_orth_dim,across(item_size))
 
-            if (item_number+1) < len(self._items):
+            if (item_number+1) < n_items:
                 cum_dim += self._spacing # space between elements
         cum_dim += self._contents_margins # last margin
         orth_dim = max_orth_dim # value without adding margins
@@ -550,13 +674,7 @@ class BoxLayout(Layout):
         # ---------------------------------
 
         # Step 2: another pass in which expansion takes place
-        total_stretch = 0
-        for item,stretch,alignment,xml in self._items:
-            total_stretch += stretch
-        if (self._direction in [LeftToRight, RightToLeft]):
-            dim_unfilled_length = max(0,min_size.width - cum_dim)
-        else:
-            dim_unfilled_length = max(0,min_size.height - cum_dim)
+        dim_unfilled_length = max(0,along(min_size) - cum_dim)
 
         stretch_hack = False
         if dim_unfilled_length > 0:
@@ -572,55 +690,36 @@ class BoxLayout(Layout):
         else:
             stretch_inc = 0
 
+        if n_items and make_coord is None:
+            raise NotImplementedError(
+                'direction %s not implemented'%self._direction)
+
         cum_dim = 0 # size along layout direction
         cum_dim += self._contents_margins # first margin
         is_last_item = False
-        for i,(_item,old_item_size) in enumerate(zip(self._items,item_sizes)):
-            if (i+1) >= len(self._items):
+        placements = []
+        for i,(_item,old_item_size) in enumerate(zip(items,item_sizes)):
+            if (i+1) >= n_items:
                 is_last_item=True
             (item,stretch,alignment,xml) = _item
-            if (self._direction in [LeftToRight, RightToLeft]):
-                new_dim_length = old_item_size.width + stretch*stretch_inc
-                if stretch_hack and is_last_item:
-                    new_dim_length = old_item_size.width + dim_unfilled_length
-                new_item_size = Size( new_dim_length, orth_dim )
-            else:
-                new_dim_length = old_item_size.height + stretch*stretch_inc
-                if stretch_hack and is_last_item:
-                    new_dim_length = old_item_size.width + dim_unfilled_length
-                new_item_size = Size( orth_dim, new_dim_length )
+            new_dim_length = along(old_item_size) + stretch*stretch_inc
+            if stretch_hack and is_last_item:
+                new_dim_length = along(old_item_size) + dim_unfilled_length
+            new_item_size = make_size( new_dim_length, orth_dim )
 
-            if isinstance(item, SVGFileNoLayout):
-                item_size = Size(0,0)
-            else:
-                item_size = item.get_size(min_size=new_item_size, box_align=alignment,level=level+1)
-            if self._direction == LeftToRight:
-                child_box_coord = (cum_dim, self._contents_margins)
-            elif self._direction == TopToBottom:
-                child_box_coord = (self._contents_margins, cum_dim)
-            else:
-                raise NotImplementedError(
-                    'direction %s not implemented'%self._direction)
-            child_box_coord = (child_box_coord[0] + self._coord[0],
-                               child_box_coord[1] + self._coord[1])
+            item_size = item._measured_size(new_item_size, alignment, level+1)
+            child_box_coord = make_coord(cum_dim, self._contents_margins)
             child_box_size = new_item_size
 
-            item_pos, final_item_size = self._calc_box( child_box_coord, child_box_size,
-                                                        item_size,
-                                                        alignment )
-            # FIXME : don't call internal funtion on another class
-            # FIXME : get_size should not set size
-            item._set_coord( item_pos )
-            item._set_size( final_item_size )
+            # position relative to self._coord
+            rel_pos, final_item_size = self._calc_box( child_box_coord, child_box_size,
+                                                       item_size,
+                                                       alignment )
+            placements.append( (item, rel_pos, final_item_size) )
 
-            if self._direction in [LeftToRight, RightToLeft]:
-                # Use requested item size so ill behaved item doesn't
-                # screw up layout.
-                cum_dim += new_item_size.width
-            else:
-                # Use requested item size so ill behaved item doesn't
-                # screw up layout.
-                cum_dim += new_item_size.height
+            # Use requested item size so ill behaved item doesn't
+            # screw up layout.
+            cum_dim += new_dim_length
 
             if not is_last_item:
                 cum_dim += self._spacing # space between elements
@@ -630,14 +729,21 @@ class BoxLayout(Layout):
 
         # Step 3: calculate coordinates of each item
 
-        if self._direction in [LeftToRight, RightToLeft]:
-            size = Size(cum_dim, max_orth_dim)
-        else:
-            size = Size(max_orth_dim, cum_dim)
+        size = make_size(cum_dim, max_orth_dim)
 
+        self._size_cache[key] = (size, placements)
+        self._place_items(placements)
         self._size = size
         return size
 
+    def _place_items(self, placements):
+        for item, rel_pos, final_item_size in placements:
+            # FIXME : don't call internal funtion on another class
+            # FIXME : get_size should not set size
+            item._set_coord( (rel_pos[0] + self._coord[0],
+                              rel_pos[1] + self._coord[1]) )
+            item._set_size( final_item_size )
+
     def _calc_box(self, in_pos, in_sz, item_sz, alignment):
         if (AlignLeft & alignment):
             left = in_pos[0]
@@ -676,6 +782,7 @@ class BoxLayout(Layout):
 
     def setSpacing(self,spacing):
         self._spacing = spacing
+        self._size_cache.clear()
 
     def addSVG(self, svg_file, stretch=0, alignment=0, xml=None):
         if not isinstance(svg_file, SVGFile):
@@ -683,6 +790,7 @@ class BoxLayout(Layout):
         if xml is not None:
             xml = etree.XML(xml)
         self._items.append((svg_file, stretch, alignment, xml))
+        self._size_cache.clear()
 
     def addSVGNoLayout(self, svg_file, x=0, y=0, xml=None):
         if not isinstance(svg_file,SVGFileNoLayout):
@@ -692,12 +800,14 @@ class BoxLayout(Layout):
         if xml is not None:
             xml = etree.XML(xml)
         self._items.append((svg_file,stretch,alignment,xml))
+        self._size_cache.clear()
 
     def addLayout(self, layout, stretch=0):
         assert isinstance(layout, Layout)
         alignment=0 # always expand a layout
         xml=None
         self._items.append((layout, stretch, alignment, xml))
+        self._size_cache.clear()
 
 
 class HBoxLayout(BoxLayout):
@@ -712,8 +822,15 @@ class VBoxLayout(BoxLayout):
 
 def get_files(globbed_fnames):
   """Gets full list of file names."""
-  return [fname for globbed_fname in globbed_fnames
-          for fname in glob.iglob(globbed_fname)]
+  fnames = []
+  for globbed_fname in globbed_fnames:
+    if glob.has_magic(globbed_fname):
+      fnames.extend(glob.iglob(globbed_fname))
+    elif os.path.lexists(globbed_fname):
+      # plain file name, no need to list its directory. Like glob,
+      # skip names that do not exist.
+      fnames.append(globbed_fname)
+  return fnames
 
 
 # ------------------------------------------------------------------
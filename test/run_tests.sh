@@ -5,4 +5,7 @@ python test2.py
 python test3.py
 python test4.py
 python test5.py
+python test6.py
+python test7.py
+python test8.py
 echo 'OK'
@@ -3,6 +3,8 @@ from __future__ import print_function
 
 import subprocess
 
+from lxml import etree
+
 # stack two Inkscape generated files
 subprocess.check_call(
     '../svg_stack.py --direction=h --margin=100 red_ball.svg blue_triangle.svg > shapes_test.svg',
@@ -10,6 +12,14 @@ subprocess.check_call(
 
 # Inkscape files don't pass xmllint -- don't test
 
+# Inkscape's <sodipodi:namedview> is not copied, so the id="base" of
+# both files is not duplicated
+root = etree.parse('shapes_test.svg').getroot()
+assert not root.findall(
+    './/{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}namedview')
+ids = root.xpath('//@id')
+assert len(ids) == len(set(ids))
+
 print('You should manually verify that shapes_test.svg looks exactly the same as shapes.svg')
 
 # subprocess.check_call(
@@ -3,6 +3,8 @@ from __future__ import print_function
 
 import subprocess
 
+from lxml import etree
+
 # "stack" a single Inkscape file
 subprocess.check_call(
     '../svg_stack.py inkscape-pattern.svg > inkscape-pattern-copy.svg',
@@ -10,6 +12,9 @@ subprocess.check_call(
 
 # Inkscape files don't pass xmllint -- don't test
 
+# Inkscape's <sodipodi:namedview> is not copied
+assert not etree.parse('inkscape-pattern-copy.svg').findall('.//{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}namedview')
+
 print('You should manually verify that inkscape-pattern.svg looks exactly the same as inkscape-pattern-copy.svg')
 
 # subprocess.check_call(
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+from __future__ import print_function
+
+import os, shutil, sys, tempfile
+
+sys.path.insert(0, '..')
+import svg_stack as ss
+
+# a file stacked repeatedly is parsed from the cache, but re-parsed once
+# it is modified
+tmpdir = tempfile.mkdtemp()
+try:
+    fname = os.path.join(tmpdir, 'red_ball.svg')
+    shutil.copy('red_ball.svg', fname)
+
+    first = ss.SVGFile(fname)
+    second = ss.SVGFile(fname)
+    third = ss.SVGFile(fname) # from the cache
+    roots = [f.get_root() for f in (first, second, third)]
+    assert len(set(id(r) for r in roots)) == 3
+
+    # Stacking moves the children out of each file's tree and prefixes
+    # their ids. The cached tree (kept when `second` was parsed) must
+    # not be affected, so stack all three.
+    def contents(root):
+        return len(root), [e.get('id') for e in root.iterdescendants()]
+    pristine = contents(first.get_root())
+
+    doc = ss.Document()
+    layout = ss.VBoxLayout()
+    for svgfile in (first, second, third):
+        layout.addSVG(svgfile, alignment=ss.AlignCenter)
+    doc.setLayout(layout)
+    doc.save(os.path.join(tmpdir, 'stacked.svg'))
+    assert contents(ss.SVGFile(fname).get_root()) == pristine
+
+    # same file size, only the width and the modification time change
+    with open(fname) as fd:
+        buf = fd.read()
+    assert 'width="198.14285"' in buf
+    with open(fname, 'w') as fd:
+        fd.write(buf.replace('width="198.14285"', 'width="298.14285"', 1))
+    st = os.stat(fname)
+    os.utime(fname, (st.st_atime, st.st_mtime + 10))
+
+    assert ss.SVGFile(fname).get_size().width == 298.14285
+finally:
+    shutil.rmtree(tmpdir)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+from __future__ import print_function
+
+import io, re, sys
+
+from lxml import etree
+
+sys.path.insert(0, '..')
+import svg_stack as ss
+
+# A VBoxLayout without stretch that is shorter than its HBoxLayout
+# neighbour. The unfilled height must go to its last item along the
+# vertical, so the triangle is centered next to the ball.
+layout = ss.HBoxLayout()
+layout.addSVG('red_ball.svg', alignment=ss.AlignCenter)
+layout.addSVG('blue_triangle.svg', alignment=ss.AlignCenter)
+vbox = ss.VBoxLayout()
+vbox.addSVG('blue_triangle.svg', alignment=ss.AlignCenter)
+layout.addLayout(vbox)
+
+doc = ss.Document()
+doc.setLayout(layout)
+buf = io.BytesIO()
+doc.save(buf)
+
+root = etree.fromstring(buf.getvalue())
+ball = ss.SVGFile('red_ball.svg').get_size()
+triangle = ss.SVGFile('blue_triangle.svg').get_size()
+
+assert float(root.get('height')) == ball.height
+
+(group,) = root.xpath('/svg:svg/svg:g[@id="id2:id2"]',
+                      namespaces={'svg': 'http://www.w3.org/2000/svg'})
+x, y = map(float, re.match(r'translate\((.*),(.*)\)',
+                           group.get('transform')).groups())
+assert abs(x - (ball.width + triangle.width)) < 1e-9
+assert abs(y - 0.5*(ball.height - triangle.height)) < 1e-9
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+from __future__ import print_function
+
+import io, os, shutil, sys, tempfile
+
+sys.path.insert(0, '..')
+import svg_stack as ss
+
+# Document.save() writes the same document to every kind of output
+
+def save(fileobj):
+    layout = ss.HBoxLayout()
+    layout.addSVG('red_ball.svg', alignment=ss.AlignCenter)
+    layout.addSVG('blue_triangle.svg', alignment=ss.AlignCenter)
+    doc = ss.Document()
+    doc.setLayout(layout)
+    doc.save(fileobj)
+
+class WriteOnly(object):
+    """has write() but no flush() or close()"""
+    def __init__(self):
+        self.chunks = []
+    def write(self, data):
+        self.chunks.append(data)
+
+tmpdir = tempfile.mkdtemp()
+try:
+    outputs = {}
+
+    fname = os.path.join(tmpdir, 'path.svg')
+    save(fname)
+    with open(fname, 'rb') as fd:
+        outputs['path'] = fd.read()
+
+    fname = os.path.join(tmpdir, 'text.svg')
+    with io.open(fname, 'w', encoding='utf-8') as fd:
+        save(fd)
+    with open(fname, 'rb') as fd:
+        outputs['text file'] = fd.read()
+
+    buf = io.StringIO()
+    save(buf)
+    outputs['StringIO'] = buf.getvalue().encode('utf-8')
+
+    buf = io.BytesIO()
+    save(buf)
+    outputs['BytesIO'] = buf.getvalue()
+
+    writer = WriteOnly()
+    save(writer)
+    outputs['write only'] = b''.join(writer.chunks)
+finally:
+    shutil.rmtree(tmpdir)
+
+expected = outputs['path']
+assert expected.startswith(b'<?xml')
+for name, buf in outputs.items():
+    assert buf == expected, name